@@ -0,0 +1,31 @@
+import sys
+import subprocess
+
+MODULES = ['pkoffice', 'pkoffice.file', 'pkoffice.outlook', 'pkoffice.parser',
+           'pkoffice.api', 'pkoffice.sql', 'pkoffice.excel']
+REPEAT = 5
+
+
+def import_time(module: str) -> float:
+    """
+    Function to measure import time of module in fresh interpreter using -X importtime
+    :param module: module name
+    :return: cumulative import time in milliseconds, None if import failed
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    for line in reversed(result.stderr.splitlines()):
+        *_, cumulative, name = [x.strip() for x in line.split('|')]
+        if name == module:
+            return int(cumulative) / 1000
+    return None
+
+
+if __name__ == '__main__':
+    print(f"{'module':<20}{'best [ms]':>12}")
+    for module in MODULES:
+        times = [import_time(module) for _ in range(REPEAT)]
+        best = None if None in times else f'{min(times):.1f}'
+        print(f"{module:<20}{best or 'import failed':>12}")
@@ -1,5 +1,22 @@
-from pkoffice import excel
-from pkoffice import file
-from pkoffice import outlook
-from pkoffice import parser
-from pkoffice import sql
+import importlib
+from pkoffice import profiling
+
+__all__ = ['api', 'excel', 'file', 'outlook', 'parser', 'pipeline', 'sql']
+
+
+def __getattr__(name: str):
+    """
+    Function to import submodules on first use, so `import pkoffice` does not load
+    pandas, SQLAlchemy, requests or Windows-only libraries until they are needed.
+    :param name: submodule name
+    :return: imported submodule
+    """
+    if name in __all__:
+        module = importlib.import_module(f'{__name__}.{name}')
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(__all__))
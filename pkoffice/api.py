@@ -0,0 +1,400 @@
+import re
+import json
+import time
+import codecs
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+import sys
+from pkoffice import profiling
+
+TOKEN_REFRESH_MARGIN = 300
+RETRY_STATUS = (429, 500, 502, 503, 504)
+JSON_CHUNK_BYTES = 1024 * 1024
+JSON_FRAME_ROWS = 10000
+_JSON_SEPARATORS = re.compile(r'[\s,]*')
+
+_session = requests.Session()
+_tokens = {}
+_tokens_lock = threading.Lock()
+
+
+def api_azure_credential(tenant_id: str, client_id: str, client_secret: str):
+    """
+    Function to create Azure credential for client secret authentication.
+    :param tenant_id: Azure tenant id
+    :param client_id: application (client) id
+    :param client_secret: application secret
+    :return: azure.identity.ClientSecretCredential
+    """
+    from azure.identity import ClientSecretCredential
+    return ClientSecretCredential(authority='https://login.microsoftonline.com/',
+                                  tenant_id=tenant_id, client_id=client_id,
+                                  client_secret=client_secret)
+
+
+def api_azure_token_generation(tenant_id: str, client_id: str, client_secret: str, scope: str) -> str:
+    """
+    Function to generate Azure access token. Token is cached until shortly before it expires.
+    :param tenant_id: Azure tenant id
+    :param client_id: application (client) id
+    :param client_secret: application secret
+    :param scope: scope of token
+    :return: access token with Bearer prefix
+    """
+    key = (tenant_id, client_id, client_secret, scope)
+    with _tokens_lock:
+        credential, token, expires_on = _tokens.get(key, (None, None, 0))
+        if token is None or time.time() > expires_on - TOKEN_REFRESH_MARGIN:
+            if credential is None:
+                credential = api_azure_credential(tenant_id, client_id, client_secret)
+            access_token = credential.get_token(scope)
+            token, expires_on = access_token.token, access_token.expires_on
+            _tokens[key] = (credential, token, expires_on)
+    return 'Bearer ' + token
+
+
+def api_get_response(url: str, access_token: str, apim_key: str) -> str:
+    headers = {
+        'Cache-Control': 'no-cache',
+        'Authorization': access_token,
+        'Ocp-Apim-Subscription-Key': apim_key,
+    }
+    query_result = _session.get(url=url, headers=headers)
+    return query_result.json()
+
+
+def api_get_query(url: str, body: str, access_token: str, apim_key: str) -> str:
+    headers = {
+        'Cache-Control': 'no-cache',
+        'Authorization': access_token,
+        'Ocp-Apim-Subscription-Key': apim_key,
+    }
+    query_result = _session.post(url=url, headers=headers, json=body)
+    return query_result.json()
+
+
+def api_json_records(chunks, array_key: str = None):
+    """
+    Generator to parse JSON array incrementally from byte chunks, so whole response
+    is never kept in memory.
+    :param chunks: iterable of bytes e.g. requests.Response.iter_content()
+    :param array_key: None - top level array, key name - array in top level object
+                      e.g. 'value' for {"value": [...]}
+    :return: generator of array items
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    chunks = iter(chunks)
+    buf, pos, eof = '', 0, False
+
+    def read_more():
+        nonlocal buf, pos, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            buf = buf[pos:] + text_decoder.decode(b'', final=True)
+        else:
+            buf = buf[pos:] + text_decoder.decode(chunk)
+        pos = 0
+
+    def skip_separators() -> bool:
+        """
+        Function to move position to next token.
+        :return: False if end of data was reached
+        """
+        nonlocal pos
+        while True:
+            pos = _JSON_SEPARATORS.match(buf, pos).end()
+            if pos < len(buf):
+                return True
+            if eof:
+                return False
+            read_more()
+
+    def next_value():
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                if not eof and (end >= len(buf) or (
+                        isinstance(value, (int, float)) and not isinstance(value, bool)
+                        and buf[end] in '.eE' and len(buf) - end <= 2)):
+                    # number split after '.' or exponent is decoded as shorter number
+                    raise ValueError('Value may be incomplete.')
+            except ValueError:
+                if eof:
+                    raise
+                read_more()
+                continue
+            pos = end
+            return value
+
+    def expect(char: str) -> None:
+        nonlocal pos
+        if not skip_separators() or buf[pos] != char:
+            raise ValueError(f"Expected '{char}' at position {pos} of JSON stream.")
+        pos += 1
+
+    if array_key is not None:
+        expect('{')
+        while True:
+            if not skip_separators() or buf[pos] == '}':
+                return
+            key = next_value()
+            expect(':')
+            if key == array_key:
+                break
+            skip_separators()
+            next_value()
+    expect('[')
+    match_separators, raw_decode = _JSON_SEPARATORS.match, decoder.raw_decode
+    while True:
+        # fast path, value followed by more than 2 characters can not be split by chunk end
+        pos = match_separators(buf, pos).end()
+        try:
+            value, end = raw_decode(buf, pos)
+        except ValueError:
+            end = len(buf)
+        if end < len(buf) - 2:
+            pos = end
+            yield value
+            continue
+        if not skip_separators() or buf[pos] == ']':
+            return
+        yield next_value()
+
+
+def _json_flatten(frame, sep: str, prefix: str = ''):
+    """
+    Function to flatten columns with nested objects column by column, the same way as
+    pd.json_normalize does record by record (lists are kept as they are).
+    :param frame: pandas dataframe created from records
+    :param sep: separator of nested column names
+    :param prefix: prefix of column names of nested object
+    :return: flattened dataframe
+    """
+    import numpy as np
+    import pandas as pd
+    parts = []
+    for name, column in frame.items():
+        name = f'{prefix}{name}'
+        if column.dtype == object:
+            values = column.to_numpy()
+            is_dict = np.fromiter((type(v) is dict for v in values), bool, len(values))
+            if is_dict.any():
+                # column is kept when it has other values than dicts or missing keys (NaN)
+                if any(not (type(v) is float and v != v) for v in values[~is_dict]):
+                    parts.append(column.where(~is_dict).rename(name))
+                nested = pd.DataFrame(list(values[is_dict]), index=column.index[is_dict])
+                parts.append(_json_flatten(nested, sep, f'{name}{sep}'))
+                continue
+        parts.append(column.rename(name))
+    if not parts:
+        return pd.DataFrame(index=frame.index)
+    return pd.concat(parts, axis=1)
+
+
+def api_json_frames(chunks, chunk_size: int = JSON_FRAME_ROWS, array_key: str = None,
+                    sep: str = '.'):
+    """
+    Generator to convert JSON array from byte chunks into flattened pandas dataframes.
+    Nested objects are flattened like pd.json_normalize, but column by column.
+    :param chunks: iterable of bytes e.g. requests.Response.iter_content()
+    :param chunk_size: number of records in single dataframe
+    :param array_key: None - top level array, key name - array in top level object
+    :param sep: separator of nested column names e.g. 'address.city'
+    :return: generator of pandas dataframes
+    """
+    import pandas as pd
+    batch = []
+    for record in api_json_records(chunks, array_key):
+        batch.append(record)
+        if len(batch) >= chunk_size:
+            yield _json_flatten(pd.DataFrame(batch), sep)
+            batch = []
+    if batch:
+        yield _json_flatten(pd.DataFrame(batch), sep)
+
+
+class ApiClient:
+    """
+    Class to manage API connection. Token is cached until shortly before it expires,
+    connections are pooled in single session, failed requests are retried with backoff
+    and requests can be sent concurrently with rate limit.
+    """
+    def __init__(self, apim_key: str = None, tenant_id: str = None, client_id: str = None,
+                 client_secret: str = None, scope: str = None, credential=None,
+                 max_workers: int = 4, rate_limit: float = None, retries: int = 3,
+                 backoff_factor: float = 0.5, timeout: float = 60, retry_post: bool = False):
+        """
+        :param apim_key: optional Ocp-Apim-Subscription-Key
+        :param tenant_id: Azure tenant id (token is not used if None and no credential)
+        :param client_id: application (client) id
+        :param client_secret: application secret
+        :param scope: scope of token
+        :param credential: optional object with get_token(scope) used instead of client secret
+        :param max_workers: maximum number of concurrent requests (and pooled connections)
+        :param rate_limit: maximum number of requests per second, None - no limit
+        :param retries: number of retries of failed requests
+        :param backoff_factor: backoff factor between retries (0.5 -> 0.5s, 1s, 2s ...)
+        :param timeout: timeout of single request in seconds
+        :param retry_post: flag to retry also POST requests, only for idempotent endpoints
+                           because retried POST may be processed twice
+        """
+        if credential is None and tenant_id is not None:
+            credential = api_azure_credential(tenant_id, client_id, client_secret)
+        self.credential = credential
+        self.scope = scope
+        self.apim_key = apim_key
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.token = None
+        self.token_expires_on = 0
+        self.token_lock = threading.Lock()
+        self.rate_interval = 1 / rate_limit if rate_limit else 0
+        self.rate_next = 0.0
+        self.rate_lock = threading.Lock()
+        allowed_methods = Retry.DEFAULT_ALLOWED_METHODS
+        if retry_post:
+            allowed_methods = allowed_methods | {'POST'}
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=RETRY_STATUS,
+                      allowed_methods=allowed_methods, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers,
+                              max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def access_token(self) -> str:
+        """
+        Method to return cached access token, new one is generated shortly before expiration.
+        :return: access token with Bearer prefix or None if no credential
+        """
+        if self.credential is None:
+            return None
+        with self.token_lock:
+            if self.token is None or time.time() > self.token_expires_on - TOKEN_REFRESH_MARGIN:
+                access_token = self.credential.get_token(self.scope)
+                self.token = 'Bearer ' + access_token.token
+                self.token_expires_on = access_token.expires_on
+            return self.token
+
+    def headers(self) -> dict:
+        headers = {'Cache-Control': 'no-cache'}
+        token = self.access_token()
+        if token is not None:
+            headers['Authorization'] = token
+        if self.apim_key is not None:
+            headers['Ocp-Apim-Subscription-Key'] = self.apim_key
+        return headers
+
+    def _rate_wait(self) -> None:
+        """
+        Method to keep requests below rate limit.
+        :return: None
+        """
+        if not self.rate_interval:
+            return
+        with self.rate_lock:
+            now = time.monotonic()
+            wait = self.rate_next - now
+            self.rate_next = max(now, self.rate_next) + self.rate_interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Method to send request through pooled session.
+        :param method: HTTP method e.g. GET, POST
+        :param url: endpoint url
+        :param kwargs: other arguments of requests.Session.request
+        :return: requests.Response, raises requests.HTTPError for failed status
+        """
+        self._rate_wait()
+        response = self.session.request(method, url, headers=self.headers(),
+                                        timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def get(self, url: str, params: dict = None):
+        """
+        Method to send GET request.
+        :param url: endpoint url
+        :param params: optional query parameters
+        :return: json response
+        """
+        return self.request('GET', url, params=params).json()
+
+    def post(self, url: str, body=None):
+        """
+        Method to send POST request with json body.
+        :param url: endpoint url
+        :param body: json body
+        :return: json response
+        """
+        return self.request('POST', url, json=body).json()
+
+    def request_frames(self, method: str, url: str, chunk_size: int = JSON_FRAME_ROWS,
+                       array_key: str = None, sep: str = '.', **kwargs):
+        """
+        Method to stream json array response as flattened dataframes, memory stays bounded
+        by chunk_size. Frames can be uploaded with SqlDB or saved to Parquet one by one.
+        :param method: HTTP method e.g. GET, POST
+        :param url: endpoint url
+        :param chunk_size: number of records in single dataframe
+        :param array_key: None - top level array, key name - array in top level object
+        :param sep: separator of nested column names
+        :param kwargs: other arguments of requests.Session.request e.g. params, json
+        :return: generator of pandas dataframes
+        """
+        with self.request(method, url, stream=True, **kwargs) as response:
+            yield from api_json_frames(response.iter_content(JSON_CHUNK_BYTES),
+                                       chunk_size, array_key, sep)
+
+    def get_frames(self, url: str, params: dict = None, chunk_size: int = JSON_FRAME_ROWS,
+                   array_key: str = None, sep: str = '.'):
+        """
+        Method to stream GET json array response as flattened dataframes.
+        :param url: endpoint url
+        :param params: optional query parameters
+        :param chunk_size: number of records in single dataframe
+        :param array_key: None - top level array, key name - array in top level object
+        :param sep: separator of nested column names
+        :return: generator of pandas dataframes
+        """
+        return self.request_frames('GET', url, chunk_size, array_key, sep, params=params)
+
+    def get_many(self, urls: list, params_list: list = None) -> list:
+        """
+        Method to send GET requests concurrently.
+        :param urls: list of endpoint urls
+        :param params_list: optional list of query parameters for every url
+        :return: list of json responses in order of urls
+        """
+        params_list = params_list or [None] * len(urls)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.get, urls, params_list))
+
+    def get_pages(self, url: str, pages: int, page_param: str = 'page', page_start: int = 1,
+                  params: dict = None) -> list:
+        """
+        Method to fetch paginated endpoint concurrently.
+        :param url: endpoint url
+        :param pages: number of pages to fetch
+        :param page_param: name of query parameter with page number
+        :param page_start: number of first page
+        :param params: other query parameters
+        :return: list of json responses in order of pages
+        """
+        params_list = [{**(params or {}), page_param: page}
+                       for page in range(page_start, page_start + pages)]
+        return self.get_many([url] * pages, params_list)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+profiling.instrument(sys.modules[__name__])
@@ -1,11 +1,14 @@
+from __future__ import annotations
 import os
 import sys
 import time
 import webbrowser
 import pandas as pd
-import xlwings as xw
-import win32com.client
-from win32com.universal import com_error
+from typing import TYPE_CHECKING
+from pkoffice import profiling
+
+if TYPE_CHECKING:
+    import xlwings as xw
 
 
 def open_excel_sharepoint(file_path: str, file_name: str, time_limit: int = 20) -> xw.Book:
@@ -16,6 +19,7 @@ def open_excel_sharepoint(file_path: str, file_name: str, time_limit: int = 20)
     :param time_limit: time limit to wait to open Excel on desktop app
     :return: xlwings book to further process
     """
+    import xlwings as xw
     webbrowser.open(file_path)
     time.sleep(time_limit)
     return xw.Book(file_name)
@@ -38,6 +42,7 @@ def close_columns_autofit(report_path: str, sheet: str) -> None:
     :param sheet: Sheet name of Excel file
     :return: None
     """
+    import xlwings as xw
     wb = xw.Book(report_path)
     sh = wb.sheets(sheet)
     sh.autofit("columns")
@@ -53,6 +58,7 @@ def filters_clean_filter(wb: xw.Book, sh: xw.sheets) -> None:
     :param sh: sheet variable
     :return: None
     """
+    from win32com.universal import com_error
     if sh.api.AutoFilterMode:
         sh.api.AutoFilter.ShowAllData()
     try:
@@ -68,6 +74,7 @@ def filters_remove_filter(wb: xw.Book, sh: xw.sheets) -> None:
     :param sh: sheet variable
     :return: None
     """
+    from win32com.universal import com_error
     if sh.api.AutoFilterMode:
         sh.api.AutoFilterMode = False
     try:
@@ -108,6 +115,7 @@ def refresh_all_tables_without_open(file: str) -> None:
     :param file: path to Excel file which need to be refreshed
     :return: None
     """
+    import win32com.client
     excel = win32com.client.Dispatch("Excel.Application")
     excel.Visible = False
     wb = excel.Workbooks.Open(file)
@@ -124,6 +132,7 @@ def refresh_macro_without_open(file: str, macro: str) -> None:
     :param macro: macro name which is located in Excel file
     :return: None
     """
+    import win32com.client
     excel = win32com.client.Dispatch("Excel.Application")
     try:
         excel.Visible = False
@@ -164,6 +173,7 @@ def create_table_win32(df: pd.DataFrame, excel_path: str, excel_sheet: str, tabl
     :param table_name: table name
     :return: None
     """
+    import win32com.client
     excel = win32com.client.Dispatch("Excel.Application")
     workbook = excel.Workbooks(excel_path)
     sheet = workbook.Sheets(excel_sheet)
@@ -235,6 +245,7 @@ def copy_column_win32(excel_path: str, excel_sheet: str, excel_column: str) -> p
     :param excel_column: Indicated Excel column to copy data
     :return: pandas dataframe
     """
+    import win32com.client
     df = pd.DataFrame()
     excel = win32com.client.Dispatch("Excel.Application")
     workbook = excel.Workbooks(excel_path)
@@ -243,4 +254,7 @@ def copy_column_win32(excel_path: str, excel_sheet: str, excel_column: str) -> p
         column_data = sheet.Range(f"{excel_column}:{excel_column}0000").Value
         df = pd.DataFrame(column_data[1:], columns=[column_data[0][0]])
     finally:
-        return df
\ No newline at end of file
+        return df
+
+
+profiling.instrument(sys.modules[__name__])
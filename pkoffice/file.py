@@ -1,9 +1,36 @@
+import ctypes
+import ctypes.util
 import datetime
+import fnmatch
 import os
 import re
+import select
+import sys
+import struct
+import tempfile
 import time
 import shutil
 import glob
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pkoffice import profiling
+
+SYNC_MAX_WORKERS = 8
+HASH_BLOCK_SIZE = 1024 * 1024
+REWRITE_BLOCK_SIZE = 1024 * 1024
+DOWNLOAD_PARTIAL_SUFFIXES = ('.crdownload', '.part', '.partial', '.download')
+DOWNLOAD_STABLE_SECONDS = 0.2
+DOWNLOAD_BACKOFF_MIN = 0.05
+DOWNLOAD_BACKOFF_MAX = 1.0
+VERSION_MANIFEST_NAME = 'manifest.json'
+INOTIFY_NONBLOCK = 0o4000
+INOTIFY_CLOEXEC = 0o2000000
+# IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+INOTIFY_MASK = 0x002 | 0x004 | 0x008 | 0x040 | 0x080 | 0x100 | 0x200
+# IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE - events changing folder state
+INOTIFY_STRUCTURE_MASK = 0x008 | 0x040 | 0x080 | 0x100 | 0x200
+INOTIFY_EVENT_SIZE = struct.calcsize('iIII')
 
 
 def files_copy_directory(path_source, path_destination, filter_re=None) -> int:
@@ -17,7 +44,7 @@ def files_copy_directory(path_source, path_destination, filter_re=None) -> int:
     try:
         files = os.listdir(path_source)
         for fname in files:
-            if re.search(filter_re, fname) or filter is None:
+            if filter_re is None or re.search(filter_re, fname):
                 shutil.copy2(os.path.join(path_source, fname), path_destination)
         return 1
     except OSError:
@@ -51,31 +78,148 @@ def files_delete(file_paths: list) -> None:
             os.remove(file)
 
 
+def _inotify_open(directory: str):
+    """
+    Function to start inotify watch on directory (Linux only)
+    :param directory: path to watched folder
+    :return: inotify file descriptor or None if inotify is not available
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(INOTIFY_NONBLOCK | INOTIFY_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(directory), INOTIFY_MASK) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+def _download_state(directory: str, patterns: list, nfiles: int = None):
+    """
+    Function to check state of downloading files in directory
+    :param directory: path to folder where files are downloaded
+    :param patterns: list of file name patterns (glob style) which have to appear
+    :param nfiles: optional expected number of files in directory
+    :return: (all files present, newest mtime of matched files, directory snapshot)
+    """
+    entries = {}
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_file():
+                st = entry.stat()
+                entries[entry.name] = (st.st_size, st.st_mtime)
+    present = not any(name.endswith(DOWNLOAD_PARTIAL_SUFFIXES) for name in entries)
+    if nfiles and len(entries) != nfiles:
+        present = False
+    mtime_newest = 0.0
+    for pattern in patterns:
+        matched = fnmatch.filter(entries, pattern)
+        if not matched:
+            present = False
+        for name in matched:
+            mtime_newest = max(mtime_newest, entries[name][1])
+    return present, mtime_newest, entries
+
+
+def _inotify_events(fd: int) -> list:
+    """
+    Function to read pending inotify events
+    :param fd: inotify file descriptor
+    :return: list of (mask, file name)
+    """
+    events = []
+    while True:
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return events
+        if not data:
+            return events
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = struct.unpack_from('iIII', data, offset)
+            offset += INOTIFY_EVENT_SIZE
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((mask, os.fsdecode(name)))
+
+
+def files_download_wait_patterns(directory: str, patterns: list, timeout_seconds: float,
+                                 nfiles: int = None,
+                                 stable_seconds: float = DOWNLOAD_STABLE_SECONDS) -> bool:
+    """
+    Function to wait for downloading files. It is woken by inotify events on Linux
+    and falls back to scanning directory with adaptive backoff elsewhere.
+    Download is complete when every pattern matches a file, no partial download
+    files exist and matched files did not change for stable_seconds.
+    :param directory: path to folder where files will be downloaded
+    :param patterns: list of file name patterns (glob style) e.g. ['report*.xlsx', 'data.csv']
+    :param timeout_seconds: wall clock time limit to wait
+    :param nfiles: optional number of files expected in directory
+    :param stable_seconds: time matched files must not be modified to be treated as complete
+    :return: True - if download completed, False - if timeout was reached
+    """
+    deadline = time.monotonic() + timeout_seconds
+    fd = _inotify_open(directory)
+    backoff = DOWNLOAD_BACKOFF_MIN
+    snapshot_prev = None
+    rescan = True
+
+    def relevant(name):
+        return name.endswith(DOWNLOAD_PARTIAL_SUFFIXES) or \
+            any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+    try:
+        while True:
+            if rescan:
+                present, mtime_newest, snapshot = _download_state(directory, patterns, nfiles)
+                rescan = False
+            now = time.monotonic()
+            wait = deadline - now
+            if present:
+                quiet = time.time() - mtime_newest
+                if quiet >= stable_seconds:
+                    return True
+                wait = min(wait, stable_seconds - quiet)
+            if now >= deadline:
+                return False
+            if fd is not None:
+                if select.select([fd], [], [], wait)[0]:
+                    for mask, name in _inotify_events(fd):
+                        if mask & INOTIFY_STRUCTURE_MASK and (nfiles or relevant(name)):
+                            rescan = True
+                        elif relevant(name):
+                            mtime_newest = max(mtime_newest, time.time())
+            else:
+                if snapshot != snapshot_prev:
+                    backoff = DOWNLOAD_BACKOFF_MIN
+                snapshot_prev = snapshot
+                time.sleep(min(wait, backoff))
+                backoff = min(backoff * 2, DOWNLOAD_BACKOFF_MAX)
+                rescan = True
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+
 def files_download_wait(directory: str, file_name: str, timeout_seconds: int,
-                        nfiles: int = None) -> None:
+                        nfiles: int = None) -> float:
     """
     Function to wait for files which are downloading
     :param directory: path to folder where file will be downloaded
     :param file_name: name of the downloading file
     :param timeout_seconds: time computer will be wait if something go wrong
     :param nfiles: number of files
-    :return: None
+    :return: elapsed seconds
     """
-    seconds = 0
-    dl_wait = True
-    while dl_wait and seconds < timeout_seconds:
-        time.sleep(1)
-        dl_wait = False
-        files = os.listdir(directory)
-        if nfiles and len(files) != nfiles:
-            dl_wait = True
-        if file_name not in files:
-            dl_wait = True
-        for fname in files:
-            if fname.endswith('.crdownload'):
-                dl_wait = True
-        seconds += 1
-    return seconds
+    time_beg = time.monotonic()
+    files_download_wait_patterns(directory, [glob.escape(file_name)], timeout_seconds, nfiles)
+    return time.monotonic() - time_beg
 
 
 def files_list(folder: str, file_filter: str = '*') -> list:
@@ -180,46 +324,122 @@ def file_content_write(path: str, content_new: list) -> None:
         f.writelines(content_new)
 
 
-def file_content_remove_lines(file_path: str, cond_in: str) -> None:
+def _file_rewrite_atomic(file_path: str, process, encoding: str = None) -> None:
     """
-    Function to remove proper lines in file
+    Function to rewrite file through temporary file in the same folder which
+    replaces original one atomically, so crash never leaves truncated file
     :param file_path: path to file
-    :param cond_in: parameter which is in line to be removed
+    :param process: function(source, destination) streaming content between opened files
+    :param encoding: file encoding
+    :return: None
+    """
+    folder, name = os.path.split(os.path.abspath(file_path))
+    with open(file_path, 'r', encoding=encoding, newline='') as src:
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f'.{name}.', suffix='.tmp')
+        try:
+            with open(fd, 'w', encoding=encoding, newline='') as dst:
+                process(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    try:
+        shutil.copymode(file_path, tmp_path)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def file_content_remove_lines_many(file_path: str, conds_in: list, encoding: str = None) -> None:
+    """
+    Function to remove lines containing any of the conditions in single streaming pass
+    :param file_path: path to file
+    :param conds_in: list of parameters which are in lines to be removed
+    :param encoding: file encoding
     :return: None
     """
+    def process(src, dst):
+        for line in src:
+            if not any(cond in line for cond in conds_in):
+                dst.write(line)
+
     try:
-        with open(file_path, 'r') as file:
-            lines = file.readlines()
-        with open(file_path, 'w') as file:
-            for line in lines:
-                if cond_in not in line:
-                    file.write(line)
+        _file_rewrite_atomic(file_path, process, encoding)
     except FileNotFoundError:
         print(f"File '{file_path}' not found.")
     except Exception as e:
         print(f"An error occurred: {e}")
 
 
-def file_content_replace(file_path: str, old_char: str, new_char: str) -> None:
+def file_content_replace_many(file_path: str, replacements: dict, encoding: str = None,
+                              block_size: int = REWRITE_BLOCK_SIZE) -> None:
     """
-    Function to replace proper char in file
+    Function to replace many strings in file in single pass reading it in fixed-size blocks.
+    All replacements are applied simultaneously, replaced text is not searched again.
     :param file_path: path to file
-    :param old_char: old char to be replaced
-    :param new_char: new char
+    :param replacements: dictionary {old: new}
+    :param encoding: file encoding
+    :param block_size: number of chars read at once
     :return: None
     """
+    keys = sorted((k for k in replacements if k), key=len, reverse=True)
+    if not keys:
+        return
+    pattern = re.compile('|'.join(map(re.escape, keys)))
+    overlap = len(keys[0]) - 1
+
+    def process(src, dst):
+        carry = ''
+        while True:
+            block = src.read(block_size)
+            buf = carry + block
+            if not block:
+                dst.write(pattern.sub(lambda m: replacements[m.group(0)], buf))
+                return
+            safe = len(buf) - overlap
+            pos = 0
+            for m in pattern.finditer(buf):
+                if m.start() >= safe:
+                    break
+                dst.write(buf[pos:m.start()])
+                dst.write(replacements[m.group(0)])
+                pos = m.end()
+            pos_carry = max(pos, safe)
+            dst.write(buf[pos:pos_carry])
+            carry = buf[pos_carry:]
+
     try:
-        with open(file_path, 'r') as file:
-            lines = file.read()
-        modified_lines = lines.replace(old_char, new_char)
-        with open(file_path, 'w') as file:
-            file.write(modified_lines)
+        _file_rewrite_atomic(file_path, process, encoding)
     except FileNotFoundError:
         print(f"File '{file_path}' not found.")
     except Exception as e:
         print(f"An error occurred: {e}")
 
 
+def file_content_remove_lines(file_path: str, cond_in: str) -> None:
+    """
+    Function to remove proper lines in file
+    :param file_path: path to file
+    :param cond_in: parameter which is in line to be removed
+    :return: None
+    """
+    file_content_remove_lines_many(file_path, [cond_in])
+
+
+def file_content_replace(file_path: str, old_char: str, new_char: str) -> None:
+    """
+    Function to replace proper char in file
+    :param file_path: path to file
+    :param old_char: old char to be replaced
+    :param new_char: new char
+    :return: None
+    """
+    file_content_replace_many(file_path, {old_char: new_char})
+
+
 def folder_delete(dir_path: str) -> None:
     """
     Function to delete whole folder with all items inside
@@ -240,6 +460,112 @@ def folder_copy(dir_source_path: str, dir_destination_path: str) -> None:
     shutil.copytree(dir_source_path, dir_destination_path, dirs_exist_ok=True)
 
 
+def file_hash(path: str, algorithm: str = 'md5') -> str:
+    """
+    Function to calculate hash of file content reading it in blocks
+    :param path: path to file
+    :param algorithm: name of hashlib algorithm
+    :return: hex digest of file content
+    """
+    h = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _sync_scan(path_source: str, path_destination: str, filter_re: str = None,
+               recursive: bool = True) -> list:
+    """
+    Function to list pairs of source/destination files for synchronisation
+    :param path_source: source folder
+    :param path_destination: destination folder
+    :param filter_re: optional filter on file name
+    :param recursive: flag to go into subfolders
+    :return: list of tuples (source entry, destination path)
+    """
+    pairs = []
+    with os.scandir(path_source) as entries:
+        for entry in entries:
+            destination = os.path.join(path_destination, entry.name)
+            if entry.is_dir():
+                if recursive:
+                    pairs.extend(_sync_scan(entry.path, destination, filter_re, recursive))
+            elif filter_re is None or re.search(filter_re, entry.name):
+                pairs.append((entry, destination))
+    return pairs
+
+
+def _sync_is_current(entry: os.DirEntry, destination: str, compare_hash: bool,
+                     mtime_tolerance: float = 0) -> bool:
+    """
+    Function to check if destination file is the same as source one
+    :param entry: source file entry
+    :param destination: path to destination file
+    :param compare_hash: flag to compare content hash when mtime differs, on match
+                         destination mtime is updated so next run does not hash again
+    :param mtime_tolerance: allowed difference of modification time in seconds, 0 - exact match
+    :return: True - if file can be skipped, False - if it has to be copied
+    """
+    try:
+        dst_stat = os.stat(destination)
+    except OSError:
+        return False
+    src_stat = entry.stat()
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+    if src_stat.st_mtime_ns == dst_stat.st_mtime_ns:
+        return True
+    if mtime_tolerance and abs(src_stat.st_mtime - dst_stat.st_mtime) <= mtime_tolerance:
+        return True
+    if compare_hash and file_hash(entry.path) == file_hash(destination):
+        shutil.copystat(entry.path, destination)
+        return True
+    return False
+
+
+def files_sync(path_source: str, path_destination: str, filter_re: str = None,
+               compare_hash: bool = False, recursive: bool = True,
+               max_workers: int = SYNC_MAX_WORKERS, mtime_tolerance: float = 0) -> dict:
+    """
+    Function to synchronise folder incrementally. Files with the same size and
+    modification time (or content hash if compare_hash) are skipped, the rest
+    is copied concurrently.
+    :param path_source: path to folder from files will be copied
+    :param path_destination: path to folder where files will be copied
+    :param filter_re: optional filter to indicate what files should be copied
+    :param compare_hash: flag to skip files with the same content but different mtime
+    :param recursive: flag to synchronise subfolders too
+    :param max_workers: maximum number of parallel copy threads
+    :param mtime_tolerance: allowed difference of modification time in seconds, 0 - exact match,
+                            e.g. 2 for FAT or SMB destinations which round modification time
+    :return: summary {'copied', 'skipped', 'failed', 'bytes', 'seconds'}
+    """
+    time_beg = time.perf_counter()
+    summary = {'copied': 0, 'skipped': 0, 'failed': 0, 'bytes': 0, 'seconds': 0.0}
+
+    def copy_single(pair):
+        entry, destination = pair
+        try:
+            if _sync_is_current(entry, destination, compare_hash, mtime_tolerance):
+                return 'skipped', 0
+            shutil.copy2(entry.path, destination)
+            return 'copied', entry.stat().st_size
+        except OSError as e:
+            print(e)
+            return 'failed', 0
+
+    pairs = _sync_scan(path_source, path_destination, filter_re, recursive)
+    for folder in {os.path.dirname(destination) for _, destination in pairs} | {path_destination}:
+        os.makedirs(folder, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for status, size in executor.map(copy_single, pairs):
+            summary[status] += 1
+            summary['bytes'] += size
+    summary['seconds'] = time.perf_counter() - time_beg
+    return summary
+
+
 def folder_create(folder_path: str) -> None:
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
@@ -275,4 +601,327 @@ def version_update(file_local_path: str, file_server_path: str,
         if local_functions_version != server_functions_version:
             file_copy(file_server_path, file_local_path)
     else:
-        file_copy(file_server_path, file_local_path)
\ No newline at end of file
+        file_copy(file_server_path, file_local_path)
+
+
+def _file_copy_atomic(path_source: str, path_destination: str) -> None:
+    """
+    Function to copy file through temporary file which replaces destination atomically
+    :param path_source: path to source file
+    :param path_destination: path to destination file
+    :return: None
+    """
+    folder = os.path.dirname(os.path.abspath(path_destination))
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    os.close(fd)
+    try:
+        shutil.copy2(path_source, tmp_path)
+        os.replace(tmp_path, path_destination)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def version_manifest_read(manifest_path: str, missing_ok: bool = True) -> dict:
+    """
+    Function to read versions manifest
+    :param manifest_path: path to manifest file
+    :param missing_ok: flag to return empty manifest if file does not exist instead of raising
+    :return: manifest {relative path: {'version', 'hash'}}
+    """
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        if missing_ok:
+            return {}
+        raise
+
+
+def version_manifest_write(manifest_path: str, manifest: dict) -> None:
+    """
+    Function to write versions manifest atomically
+    :param manifest_path: path to manifest file
+    :param manifest: manifest {relative path: {'version', 'hash'}}
+    :return: None
+    """
+    folder = os.path.dirname(os.path.abspath(manifest_path))
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with open(fd, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def version_manifest_create(folder: str, version_pattern: str = None, filter_re: str = None,
+                            manifest_name: str = VERSION_MANIFEST_NAME) -> dict:
+    """
+    Function to create manifest of files on server repository. It should be run after
+    files on server are changed.
+    :param folder: path to server repository folder
+    :param version_pattern: optional pattern to read version number from first line
+    :param filter_re: optional filter to indicate what files should be included
+    :param manifest_name: name of manifest file created in folder
+    :return: manifest {relative path: {'version', 'hash'}}
+    """
+    manifest = {}
+    for entry, _ in _sync_scan(folder, folder, filter_re):
+        if entry.name == manifest_name:
+            continue
+        path_relative = os.path.relpath(entry.path, folder).replace(os.sep, '/')
+        manifest[path_relative] = {
+            'version': version_read(entry.path, version_pattern) if version_pattern else None,
+            'hash': file_hash(entry.path),
+        }
+    version_manifest_write(os.path.join(folder, manifest_name), manifest)
+    return manifest
+
+
+def version_update_bulk(folder_local: str, folder_server: str,
+                        manifest_name: str = VERSION_MANIFEST_NAME,
+                        max_workers: int = SYNC_MAX_WORKERS, mtime_tolerance: float = 0) -> dict:
+    """
+    Function to update whole folder to versions from server repository. Server manifest
+    is compared with local one and only outdated files are copied (in parallel) and
+    swapped in atomically.
+    :param folder_local: path to folder on local computer
+    :param folder_server: path to folder on server repository with manifest
+    :param manifest_name: name of manifest file in both folders
+    :param max_workers: maximum number of parallel copy threads
+    :return: summary {'checked', 'updated', 'failed', 'seconds'}, raises OSError if server
+             manifest can not be read (missing manifest or unreachable server)
+    """
+    time_beg = time.perf_counter()
+    manifest_server = version_manifest_read(os.path.join(folder_server, manifest_name),
+                                            missing_ok=False)
+    manifest_local_path = os.path.join(folder_local, manifest_name)
+    manifest_local = version_manifest_read(manifest_local_path)
+    outdated = [path for path, item in manifest_server.items()
+                if manifest_local.get(path) != item
+                or not os.path.isfile(os.path.join(folder_local, path))]
+
+    def update_single(path):
+        try:
+            _file_copy_atomic(os.path.join(folder_server, path), os.path.join(folder_local, path))
+            return path
+        except OSError as e:
+            print(e)
+            return None
+
+    summary = {'checked': len(manifest_server), 'updated': 0, 'failed': 0, 'seconds': 0.0}
+    if outdated:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for path, path_updated in zip(outdated, executor.map(update_single, outdated)):
+                if path_updated is None:
+                    summary['failed'] += 1
+                else:
+                    summary['updated'] += 1
+                    manifest_local[path] = manifest_server[path]
+        os.makedirs(folder_local, exist_ok=True)
+        version_manifest_write(manifest_local_path, manifest_local)
+    summary['seconds'] = time.perf_counter() - time_beg
+    return summary
+
+
+def _glob_match(pattern_parts: list, path_parts: list) -> bool:
+    """
+    Function to match path against glob filter segment by segment like glob.glob,
+    '*' matches within single folder level, '**' matches any number of levels and
+    hidden names (starting with '.') are matched only explicitly.
+    :param pattern_parts: glob filter split on folder separator
+    :param path_parts: relative path split on folder separator
+    :return: True - if path matches, False if it does not match
+    """
+    if not pattern_parts:
+        return not path_parts
+    head = pattern_parts[0]
+    if head == '**':
+        for i in range(len(path_parts) + 1):
+            if _glob_match(pattern_parts[1:], path_parts[i:]):
+                return True
+            if i < len(path_parts) and path_parts[i].startswith('.'):
+                return False
+        return False
+    return (bool(path_parts) and fnmatch.fnmatchcase(path_parts[0], head)
+            and (head.startswith('.') or not path_parts[0].startswith('.'))
+            and _glob_match(pattern_parts[1:], path_parts[1:]))
+
+
+class FileCatalog:
+    """
+    Class to keep in-memory index of files in folder tree. Folder is scanned once,
+    queries are answered from index and refresh rescans only folders whose
+    modification time changed (file added, removed or renamed). Paths are compared
+    with os.path.normcase, so case-insensitively on Windows.
+    """
+    def __init__(self, root: str, recursive: bool = True):
+        self.root = os.path.abspath(root)
+        self.recursive = recursive
+        self.dirs = {}
+        self.scan()
+
+    def _scan_dir(self, dir_path: str) -> None:
+        """
+        Method to index single folder and (if recursive) its subfolders.
+        :param dir_path: absolute path to folder
+        :return: None
+        """
+        try:
+            dir_mtime = os.stat(dir_path).st_mtime
+            files = {}
+            subdirs = []
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        subdirs.append(entry.path)
+                    elif entry.is_file():
+                        st = entry.stat()
+                        files[os.path.normcase(entry.name)] = (entry.name, st.st_size, st.st_mtime)
+        except OSError:
+            self._drop_dir(dir_path)
+            return
+        self._drop_subdirs(dir_path, subdirs)
+        self.dirs[os.path.normcase(dir_path)] = (dir_path, dir_mtime, files, subdirs)
+        if self.recursive:
+            for subdir in subdirs:
+                if os.path.normcase(subdir) not in self.dirs:
+                    self._scan_dir(subdir)
+
+    def _drop_dir(self, dir_path: str) -> None:
+        """
+        Method to remove folder with its subfolders from index.
+        :param dir_path: absolute path to folder
+        :return: None
+        """
+        item = self.dirs.pop(os.path.normcase(dir_path), None)
+        if item is not None:
+            for subdir in item[3]:
+                self._drop_dir(subdir)
+
+    def _drop_subdirs(self, dir_path: str, subdirs_current: list) -> None:
+        """
+        Method to remove from index subfolders which do not exist anymore.
+        :param dir_path: absolute path to folder
+        :param subdirs_current: list of existing subfolders
+        :return: None
+        """
+        item = self.dirs.get(os.path.normcase(dir_path))
+        if item is not None:
+            for subdir in set(item[3]) - set(subdirs_current):
+                self._drop_dir(subdir)
+
+    def scan(self) -> None:
+        """
+        Method to build index from scratch.
+        :return: None
+        """
+        self.dirs = {}
+        self._scan_dir(self.root)
+
+    def refresh(self) -> int:
+        """
+        Method to rescan only folders whose modification time changed.
+        :return: number of rescanned folders
+        """
+        changed = []
+        for dir_path, dir_mtime, _, _ in self.dirs.values():
+            try:
+                if os.stat(dir_path).st_mtime != dir_mtime:
+                    changed.append(dir_path)
+            except OSError:
+                changed.append(dir_path)
+        for dir_path in changed:
+            self._scan_dir(dir_path)
+        return len(changed)
+
+    def _entry(self, path: str):
+        """
+        Method to find file in index.
+        :param path: path to file
+        :return: (name, size, mtime) or None if file is not indexed
+        """
+        dir_path, name = os.path.split(os.path.normcase(os.path.abspath(path)))
+        item = self.dirs.get(dir_path)
+        return None if item is None else item[2].get(name)
+
+    def _files(self):
+        """
+        Generator of (path, size, mtime) for all indexed files.
+        """
+        for dir_path, _, files, _ in self.dirs.values():
+            for name, size, mtime in files.values():
+                yield os.path.join(dir_path, name), size, mtime
+
+    def _glob(self, file_filter: str):
+        """
+        Generator of (path, size, mtime) for indexed files matching glob filter.
+        :param file_filter: filter relative to root e.g. '*.xlsx' or '**/*.csv'
+        """
+        pattern_parts = os.path.normcase(os.path.normpath(file_filter)).split(os.sep)
+        start = len(self.root) + 1
+        for path, size, mtime in self._files():
+            if _glob_match(pattern_parts, os.path.normcase(path[start:]).split(os.sep)):
+                yield path, size, mtime
+
+    def exists(self, path: str) -> bool:
+        """
+        Method to check if file exists in index.
+        :param path: path to file
+        :return: True - if exists, False if it does not exist
+        """
+        return self._entry(path) is not None
+
+    def size(self, path: str) -> int:
+        """
+        Method to return file size from index.
+        :param path: path to file
+        :return: size in bytes or None if file is not indexed
+        """
+        entry = self._entry(path)
+        return None if entry is None else entry[1]
+
+    def date_modification(self, path: str) -> datetime.datetime:
+        """
+        Method to return file modification date from index.
+        :param path: path to file
+        :return: modification date or None if file is not indexed
+        """
+        entry = self._entry(path)
+        return None if entry is None else datetime.datetime.fromtimestamp(entry[2])
+
+    def match(self, pattern: str) -> list:
+        """
+        Method to list files whose path relative to root matches regular expression.
+        :param pattern: regular expression searched in relative path
+        :return: list of full paths
+        """
+        regex = re.compile(pattern)
+        start = len(self.root) + 1
+        return [path for path, _, _ in self._files() if regex.search(path[start:])]
+
+    def glob(self, file_filter: str = '*') -> list:
+        """
+        Method to list files whose path relative to root matches glob filter,
+        '*' matches within single folder level and '**' any number of levels.
+        :param file_filter: filter e.g. '*.xlsx', 'reports/*.csv' or '**/*.csv'
+        :return: list of full paths
+        """
+        return [path for path, _, _ in self._glob(file_filter)]
+
+    def newest(self, file_filter: str = '*') -> str:
+        """
+        Method to return most recently modified file matching glob filter.
+        :param file_filter: filter e.g. 'report_*.xlsx'
+        :return: full path or None if nothing matches
+        """
+        matched = [(mtime, path) for path, _, mtime in self._glob(file_filter)]
+        return max(matched)[1] if matched else None
+
+
+profiling.instrument(sys.modules[__name__])
@@ -1,7 +1,424 @@
-import win32com.client as win32
+import io
+import os
+import pickle
 import time
+import hashlib
+import smtplib
+import string
+import zipfile
+import threading
+from email.message import EmailMessage
+from concurrent.futures import ThreadPoolExecutor
+import sys
+from pkoffice import profiling
 
 ATTACHMENTS_TMP_PATH = r'C:\Temp\\'
+ATTACHMENTS_TIMEOUT = 30
+ATTACHMENTS_CHECK_INTERVAL = 0.05
+ATTACHMENTS_ZIP_THRESHOLD = 5 * 1024 * 1024
+
+
+class Attachment:
+    """
+    Class to keep attachment content in memory. Content is written to disk at most
+    once (only for Outlook which needs a file) and shared between all mails.
+    """
+    def __init__(self, name: str, content: bytes):
+        self.name = name
+        self.content = content
+        self.hash = hashlib.sha256(content).hexdigest()
+        self.file_path = None
+        self.lock = threading.Lock()
+
+    def path(self, folder: str = ATTACHMENTS_TMP_PATH) -> str:
+        """
+        Method to return path of attachment file, writing it on first use.
+        :param folder: folder where attachment file is written
+        :return: path to attachment file
+        """
+        with self.lock:
+            if self.file_path is None or not os.path.isfile(self.file_path):
+                folder_hash = os.path.join(folder, self.hash[:16])
+                os.makedirs(folder_hash, exist_ok=True)
+                file_path = os.path.join(folder_hash, self.name)
+                with open(file_path, 'wb') as f:
+                    f.write(self.content)
+                self.file_path = file_path
+            return self.file_path
+
+    def delete(self) -> None:
+        """
+        Method to delete attachment file written to disk.
+        :return: None
+        """
+        with self.lock:
+            if self.file_path is not None and os.path.isfile(self.file_path):
+                os.remove(self.file_path)
+                try:
+                    os.rmdir(os.path.dirname(self.file_path))
+                except OSError:
+                    pass
+            self.file_path = None
+
+
+def attachment_from_bytes(name: str, content: bytes, compress: bool = None,
+                          cache: dict = None) -> Attachment:
+    """
+    Function to create in-memory attachment.
+    :param name: file name visible in mail
+    :param content: file content
+    :param compress: True - zip, False - keep as is, None - zip if above ATTACHMENTS_ZIP_THRESHOLD
+    :param cache: optional dictionary of attachments e.g. MailQueue.attachments, the same name
+                  and content returns then the same attachment object (deduplication by content hash)
+    :return: attachment
+    """
+    if compress or (compress is None and len(content) > ATTACHMENTS_ZIP_THRESHOLD):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0)), content,
+                        compress_type=zipfile.ZIP_DEFLATED)
+        name, content = f'{os.path.splitext(name)[0]}.zip', buffer.getvalue()
+    attachment = Attachment(name, content)
+    if cache is None:
+        return attachment
+    return cache.setdefault(('bytes', attachment.hash, name), attachment)
+
+
+def attachment_from_df(df, name: str, file_format: str = 'xlsx', sheet_name: str = 'Sheet1',
+                       compress: bool = None, cache: dict = None) -> Attachment:
+    """
+    Function to create in-memory attachment from dataframe.
+    :param df: pandas dataframe
+    :param name: file name visible in mail without extension
+    :param file_format: xlsx or csv
+    :param sheet_name: name of Excel sheet
+    :param compress: True - zip, False - keep as is, None - zip if above ATTACHMENTS_ZIP_THRESHOLD
+    :param cache: optional dictionary of attachments e.g. MailQueue.attachments, dataframe with
+                  the same content returns then the same attachment without serializing it again
+    :return: attachment
+    """
+    if file_format not in ('xlsx', 'csv'):
+        raise ValueError(f"Attachment format '{file_format}' is not supported.")
+    key = None
+    if cache is not None:
+        import pandas as pd
+        h = hashlib.sha256(repr(list(zip(df.columns, map(str, df.dtypes)))).encode())
+        try:
+            h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+        except TypeError:
+            # cells with lists or dicts (e.g. from api_json_frames) can not be hashed by pandas
+            h.update(pickle.dumps(df.to_numpy(dtype=object)))
+        key = ('df', h.hexdigest(), name, file_format, sheet_name, compress)
+        if key in cache:
+            return cache[key]
+    buffer = io.BytesIO()
+    if file_format == 'xlsx':
+        df.to_excel(buffer, index=False, sheet_name=sheet_name)
+    else:
+        df.to_csv(buffer, index=False, encoding='utf-8-sig')
+    attachment = attachment_from_bytes(f'{name}.{file_format}', buffer.getvalue(), compress, cache)
+    if key is not None:
+        attachment = cache.setdefault(key, attachment)
+    return attachment
+
+
+def attachments_wait(attachments_list: list, timeout_seconds: float = ATTACHMENTS_TIMEOUT) -> None:
+    """
+    Function to wait until attachments exist, are not growing anymore and can be opened.
+    :param attachments_list: list of paths of attachments ['path1','path2'] or Attachment objects
+    :param timeout_seconds: time limit to wait for attachments
+    :return: None, raises TimeoutError if attachment is not ready on time
+    """
+    deadline = time.monotonic() + timeout_seconds
+    for attachment in attachments_list or []:
+        if isinstance(attachment, Attachment):
+            continue
+        size_prev = None
+        while True:
+            try:
+                size = os.path.getsize(attachment)
+                if size == size_prev:
+                    with open(attachment, 'rb'):
+                        break
+                size_prev = size
+            except OSError:
+                size_prev = None
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Attachment '{attachment}' is not ready.")
+            time.sleep(ATTACHMENTS_CHECK_INTERVAL)
+
+
+class Mail:
+    """
+    Class to keep single mail message and its sending status.
+    """
+    def __init__(self, address_to: str, address_cc: str, mail_subject: str, mail_body: str,
+                 attachments_list: list = None, address_from: str = None):
+        self.address_to = address_to
+        self.address_cc = address_cc
+        self.mail_subject = mail_subject
+        self.mail_body = mail_body
+        self.attachments_list = attachments_list or []
+        self.address_from = address_from
+        self.status = 'queued'
+        self.error = None
+        self.seconds = 0.0
+
+    def report(self) -> dict:
+        """
+        Method to return sending status of mail.
+        :return: {'address_to', 'mail_subject', 'status', 'error', 'seconds'}
+        """
+        return {'address_to': self.address_to, 'mail_subject': self.mail_subject,
+                'status': self.status, 'error': self.error, 'seconds': self.seconds}
+
+
+class OutlookTransport:
+    """
+    Class to send mails through single Outlook session.
+    Outlook COM objects can not be shared between threads, so mails are sent one by one.
+    """
+    max_workers = 1
+
+    def __init__(self):
+        self.outlook = None
+
+    def send(self, mail: Mail) -> None:
+        """
+        Method to send mail using Outlook without opening it.
+        :param mail: mail to send
+        :return: None
+        """
+        if self.outlook is None:
+            import win32com.client as win32
+            self.outlook = win32.Dispatch('Outlook.Application')
+        item = self.outlook.CreateItem(0)
+        if mail.address_from is not None:
+            item.SentOnBehalfOfName = mail.address_from
+        item.To = mail.address_to
+        item.Cc = mail.address_cc
+        item.Subject = mail.mail_subject
+        item.HTMLBody = mail.mail_body
+        attachments_wait(mail.attachments_list)
+        for attachment in mail.attachments_list:
+            if isinstance(attachment, Attachment):
+                attachment = attachment.path()
+            item.Attachments.Add(attachment)
+        item.Send()
+
+    def close(self) -> None:
+        self.outlook = None
+
+
+class SmtpTransport:
+    """
+    Class to send mails through SMTP server. Every sending thread keeps its own
+    connection which is reused for all its mails.
+    """
+    def __init__(self, host: str, port: int = 25, user: str = None, user_pass: str = None,
+                 address_from: str = None, use_tls: bool = False, max_workers: int = 4):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.user_pass = user_pass
+        self.address_from = address_from or user
+        self.use_tls = use_tls
+        self.max_workers = max_workers
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def _connection(self) -> smtplib.SMTP:
+        """
+        Method to return SMTP connection of current thread.
+        :return: smtplib.SMTP
+        """
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = smtplib.SMTP(self.host, self.port)
+            if self.use_tls:
+                conn.starttls()
+            if self.user is not None:
+                conn.login(self.user, self.user_pass)
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def message(self, mail: Mail) -> EmailMessage:
+        """
+        Method to build MIME message from mail.
+        :param mail: mail to convert
+        :return: email.message.EmailMessage
+        """
+        msg = EmailMessage()
+        msg['From'] = mail.address_from or self.address_from
+        msg['To'] = mail.address_to.replace(';', ',')
+        if mail.address_cc:
+            msg['Cc'] = mail.address_cc.replace(';', ',')
+        msg['Subject'] = mail.mail_subject
+        msg.set_content(mail.mail_body, subtype='html')
+        attachments_wait(mail.attachments_list)
+        for attachment in mail.attachments_list:
+            if isinstance(attachment, Attachment):
+                name, content = attachment.name, attachment.content
+            else:
+                with open(attachment, 'rb') as f:
+                    name, content = os.path.basename(attachment), f.read()
+            msg.add_attachment(content, maintype='application', subtype='octet-stream',
+                               filename=name)
+        return msg
+
+    def send(self, mail: Mail) -> None:
+        """
+        Method to send mail through SMTP connection of current thread.
+        :param mail: mail to send
+        :return: None
+        """
+        msg = self.message(mail)
+        try:
+            self._connection().send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            self.local.conn = None
+            self._connection().send_message(msg)
+
+    def close(self) -> None:
+        for conn in self.connections:
+            try:
+                conn.quit()
+            except smtplib.SMTPException:
+                pass
+        self.connections = []
+        self.local = threading.local()
+
+
+class MailQueue:
+    """
+    Class to collect many mails and send them through single transport session.
+    """
+    def __init__(self, transport=None):
+        self.transport = transport or OutlookTransport()
+        self.mails = []
+        self.attachments = {}
+        self.attachments_lock = threading.Lock()
+
+    def attachment_from_df(self, df, name: str, file_format: str = 'xlsx',
+                           sheet_name: str = 'Sheet1', compress: bool = None) -> Attachment:
+        """
+        Method to create in-memory attachment from dataframe shared by mails of this queue.
+        :param df: pandas dataframe
+        :param name: file name visible in mail without extension
+        :param file_format: xlsx or csv
+        :param sheet_name: name of Excel sheet
+        :param compress: True - zip, False - keep as is, None - zip if above ATTACHMENTS_ZIP_THRESHOLD
+        :return: attachment
+        """
+        with self.attachments_lock:
+            return attachment_from_df(df, name, file_format, sheet_name, compress, self.attachments)
+
+    def attachment_from_bytes(self, name: str, content: bytes, compress: bool = None) -> Attachment:
+        """
+        Method to create in-memory attachment shared by mails of this queue.
+        :param name: file name visible in mail
+        :param content: file content
+        :param compress: True - zip, False - keep as is, None - zip if above ATTACHMENTS_ZIP_THRESHOLD
+        :return: attachment
+        """
+        with self.attachments_lock:
+            return attachment_from_bytes(name, content, compress, self.attachments)
+
+    def attachments_cleanup(self) -> None:
+        """
+        Method to delete attachment files written to disk and release attachments of queue.
+        :return: None
+        """
+        with self.attachments_lock:
+            for attachment in set(self.attachments.values()):
+                attachment.delete()
+            self.attachments.clear()
+
+    def add(self, address_to: str, address_cc: str, mail_subject: str, mail_body: str,
+            attachments_list: list = None, address_from: str = None) -> Mail:
+        """
+        Method to add single mail to queue.
+        :param address_to: recipient address list 'John@John.com;Ann@Ann.com'
+        :param address_cc: recipient in copy address list 'John@John.com;Ann@Ann.com'
+        :param mail_subject: subject of mail
+        :param mail_body: body of mail using HTML
+        :param attachments_list: list of paths of attachments ['path1','path2'] or Attachment objects
+        :param address_from: indication who will send mail
+        :return: queued mail
+        """
+        mail = Mail(address_to, address_cc, mail_subject, mail_body, attachments_list, address_from)
+        self.mails.append(mail)
+        return mail
+
+    def add_merge(self, df, mail_subject: str, mail_body: str, column_to: str = 'address_to',
+                  column_cc: str = None, column_attachments: str = None,
+                  address_from: str = None) -> list:
+        """
+        Method to add mails for every row of dataframe (mail merge). Subject and body are
+        string.Template templates filled with row values e.g. 'Hello $name' or 'Hello ${name}',
+        so CSS braces in HTML body are kept as they are. Unknown placeholders are left
+        unchanged and '$$' gives literal '$'.
+        :param df: pandas dataframe with recipients and template values
+        :param mail_subject: subject template
+        :param mail_body: body template using HTML
+        :param column_to: column with recipient address list
+        :param column_cc: optional column with recipient in copy address list
+        :param column_attachments: optional column with list of paths of attachments
+        :param address_from: indication who will send mail
+        :return: list of queued mails
+        """
+        template_subject = string.Template(mail_subject)
+        template_body = string.Template(mail_body)
+        mails = []
+        for row in df.to_dict('records'):
+            mails.append(self.add(row[column_to], row[column_cc] if column_cc else '',
+                                  template_subject.safe_substitute(row),
+                                  template_body.safe_substitute(row),
+                                  row[column_attachments] if column_attachments else None,
+                                  address_from))
+        return mails
+
+    def _send_single(self, mail: Mail) -> None:
+        time_beg = time.perf_counter()
+        try:
+            self.transport.send(mail)
+            mail.status = 'sent'
+            mail.error = None
+        except Exception as e:
+            mail.status = 'failed'
+            mail.error = str(e)
+            print(e)
+        mail.seconds = time.perf_counter() - time_beg
+
+    def send(self) -> list:
+        """
+        Method to send all queued mails which were not sent yet. Attachment files written
+        to disk for Outlook are deleted afterwards, attachments stay in memory for resending.
+        :return: list of sending status per mail
+        """
+        mails = [mail for mail in self.mails if mail.status != 'sent']
+        try:
+            if self.transport.max_workers > 1:
+                with ThreadPoolExecutor(max_workers=self.transport.max_workers) as executor:
+                    list(executor.map(self._send_single, mails))
+            else:
+                for mail in mails:
+                    self._send_single(mail)
+        finally:
+            self.transport.close()
+            for attachment in set(self.attachments.values()):
+                attachment.delete()
+        return self.report()
+
+    def report(self) -> list:
+        """
+        Method to return sending status of all mails in queue.
+        :return: list of {'address_to', 'mail_subject', 'status', 'error', 'seconds'}
+        """
+        return [mail.report() for mail in self.mails]
 
 
 def send_mail(address_to: str, address_cc: str, mail_subject: str, mail_body: str,
@@ -12,20 +429,13 @@ def send_mail(address_to: str, address_cc: str, mail_subject: str, mail_body: st
     :param address_cc: recipient in copy address list 'John@John.com;Ann@Ann.com'
     :param mail_subject: subject of mail
     :param mail_body: body of mail using HTML
-    :param attachments_list: list of paths of attachments ['path1','path2']
+    :param attachments_list: list of paths of attachments ['path1','path2'] or Attachment objects
     :param address_from: indication who will send mail
     :return: None
     """
-    outlook = win32.Dispatch('Outlook.Application')
-    mail = outlook.CreateItem(0)
-    if address_from is not None:
-        mail.SentOnBehalfOfName = address_from
-    mail.To = address_to
-    mail.Cc = address_cc
-    mail.Subject = mail_subject
-    mail.HTMLBody = mail_body
-    if attachments_list is not None:
-        for attachment in attachments_list:
-            mail.Attachments.Add(attachment)
-    time.sleep(3)
-    mail.Send()
+    transport = OutlookTransport()
+    transport.send(Mail(address_to, address_cc, mail_subject, mail_body,
+                        attachments_list, address_from))
+
+
+profiling.instrument(sys.modules[__name__])
@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
+import sys
+from pkoffice import profiling
 
 
 def parse_to_date_from_number(df: pd.DataFrame,  column_names: list) -> pd.DataFrame:
@@ -73,4 +75,7 @@ def parse_to_int_with_str_nan(df: pd.DataFrame, column_names: list) -> pd.DataFr
         df[column_name] = df[column_name].astype(int)
         df[column_name] = df[column_name].astype(str)
         df[column_name] = df[column_name].replace('-9999', np.nan)
-    return df
\ No newline at end of file
+    return df
+
+
+profiling.instrument(sys.modules[__name__])
@@ -0,0 +1,272 @@
+import os
+import time
+import pickle
+import hashlib
+import inspect
+import tempfile
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pkoffice import profiling
+
+PIPELINE_CACHE_PATH = '.pkoffice_cache'
+
+
+def _hash_value(value) -> str:
+    """
+    Function to calculate content hash of node result
+    :param value: dataframe or any picklable object
+    :return: hex digest
+    """
+    h = hashlib.sha256()
+    if hasattr(value, 'columns') and hasattr(value, 'dtypes'):
+        import pandas as pd
+        h.update(repr(list(zip(value.columns, map(str, value.dtypes)))).encode())
+        try:
+            h.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+        except TypeError:
+            # cells with lists or dicts (e.g. from api_json_frames) can not be hashed by pandas
+            h.update(pickle.dumps(value))
+    else:
+        try:
+            h.update(pickle.dumps(value))
+        except Exception:
+            h.update(repr(value).encode())
+    return h.hexdigest()
+
+
+def _hash_func(func) -> str:
+    """
+    Function to identify function by its name and code, so code change invalidates cache
+    :param func: function or bound method
+    :return: hex digest
+    """
+    func = inspect.unwrap(func)
+    code = getattr(func, '__code__', None) or getattr(getattr(func, '__func__', None), '__code__', None)
+    h = hashlib.sha256(f'{getattr(func, "__module__", "")}.{getattr(func, "__qualname__", repr(func))}'.encode())
+    if code is not None:
+        h.update(code.co_code)
+        h.update(repr(code.co_consts).encode())
+    return h.hexdigest()
+
+
+class Node:
+    """
+    Class to keep single pipeline step.
+    """
+    def __init__(self, name: str, func, inputs: list = None, params: dict = None,
+                 cache: bool = True, fingerprint=None):
+        self.name = name
+        self.func = func
+        self.inputs = inputs or []
+        self.params = params or {}
+        self.cache = cache
+        self.fingerprint = fingerprint
+        self.status = 'pending'
+        self.seconds = 0.0
+        self.rows = None
+        self.error = None
+        self.result = None
+        self.key = None
+        self.output_id = None
+
+
+class Pipeline:
+    """
+    Class to run report steps as DAG. Independent nodes run in parallel and node results
+    are cached (dataframes as Parquet) by fingerprint of function, parameters and input
+    contents, so rerun skips nodes whose inputs did not change.
+    """
+    def __init__(self, cache_folder: str = PIPELINE_CACHE_PATH, max_workers: int = 4):
+        self.cache_folder = cache_folder
+        self.max_workers = max_workers
+        self.nodes = {}
+
+    def add(self, name: str, func, inputs: list = None, params: dict = None,
+            cache: bool = True, fingerprint=None) -> Node:
+        """
+        Method to add node to pipeline. Node is called as func(*input results, **params),
+        dataframe inputs are passed as copies because parser functions modify them in place.
+        :param name: unique node name
+        :param func: function to call e.g. db.download_data, parser.parse_to_float
+        :param inputs: list of names of nodes whose results are passed to func
+        :param params: keyword parameters of func
+        :param cache: flag to cache result, False for steps which must always run
+        :param fingerprint: optional function returning value which identifies source data
+               version (e.g. max modification date), nodes without inputs are cached only
+               when it is provided
+        :return: added node
+        """
+        for input_name in inputs or []:
+            if input_name not in self.nodes:
+                raise ValueError(f"Node '{input_name}' has to be added before '{name}'.")
+        node = Node(name, func, inputs, params, cache, fingerprint)
+        self.nodes[name] = node
+        return node
+
+    def _key(self, node: Node) -> str:
+        """
+        Method to calculate cache key of node. Inputs are identified by their cache keys or,
+        for nodes which are not cached, by content hash of their results.
+        :param node: pipeline node
+        :return: hex digest or None if node can not be cached
+        """
+        if not node.cache or (not node.inputs and node.fingerprint is None):
+            return None
+        h = hashlib.sha256(_hash_func(node.func).encode())
+        for param_name in sorted(node.params):
+            h.update(param_name.encode())
+            h.update(_hash_value(node.params[param_name]).encode())
+        if node.fingerprint is not None:
+            h.update(repr(node.fingerprint()).encode())
+        for input_name in node.inputs:
+            h.update(self.nodes[input_name].output_id.encode())
+        return h.hexdigest()
+
+    def _cache_path(self, node: Node, extension: str) -> str:
+        return os.path.join(self.cache_folder, node.name, f'{node.key}.{extension}')
+
+    def _cache_load(self, node: Node) -> bool:
+        """
+        Method to load node result from cache. Unreadable cache file (e.g. truncated)
+        is removed and treated as not cached.
+        :param node: pipeline node
+        :return: True - if result was loaded, False if it is not cached
+        """
+        for extension in ('parquet', 'pkl'):
+            path = self._cache_path(node, extension)
+            if not os.path.isfile(path):
+                continue
+            try:
+                if extension == 'parquet':
+                    import pandas as pd
+                    node.result = pd.read_parquet(path)
+                else:
+                    with open(path, 'rb') as f:
+                        node.result = pickle.load(f)
+                return True
+            except Exception as e:
+                print(f"Cache of node '{node.name}' is unreadable and will be rebuilt: {e}")
+                os.remove(path)
+        return False
+
+    def _cache_write(self, node: Node, extension: str, write) -> str:
+        """
+        Method to write cache file through temporary file in the same folder which
+        replaces it atomically, so killed run never leaves truncated cache file.
+        :param node: pipeline node
+        :param extension: parquet or pkl
+        :param write: function(file) writing result to opened binary file
+        :return: path to cache file
+        """
+        path = self._cache_path(node, extension)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with open(fd, 'wb') as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    def _cache_save(self, node: Node) -> None:
+        """
+        Method to save node result to cache, older results of node are removed.
+        :param node: pipeline node
+        :return: None
+        """
+        folder = os.path.join(self.cache_folder, node.name)
+        os.makedirs(folder, exist_ok=True)
+        path = None
+        if hasattr(node.result, 'to_parquet'):
+            try:
+                path = self._cache_write(node, 'parquet', lambda f: node.result.to_parquet(f, index=True))
+            except ImportError:
+                pass
+            except Exception as e:
+                print(e)
+        if path is None:
+            path = self._cache_write(node, 'pkl', lambda f: pickle.dump(node.result, f))
+        for entry in os.scandir(folder):
+            if entry.name != os.path.basename(path):
+                os.remove(entry.path)
+
+    def _run_node(self, node: Node) -> None:
+        time_beg = time.perf_counter()
+        try:
+            node.key = self._key(node)
+            if node.key is not None and self._cache_load(node):
+                status = 'cached'
+            else:
+                args = [self.nodes[input_name].result for input_name in node.inputs]
+                args = [arg.copy() if hasattr(arg, 'columns') else arg for arg in args]
+                node.result = node.func(*args, **node.params)
+                status = 'run'
+                if node.key is not None:
+                    self._cache_save(node)
+            node.output_id = node.key or _hash_value(node.result)
+            shape = getattr(node.result, 'shape', None)
+            node.rows = shape[0] if isinstance(shape, tuple) and shape else None
+            node.status = status
+        except Exception as e:
+            node.status = 'failed'
+            node.error = str(e)
+            print(f"Node '{node.name}' failed: {e}")
+        node.seconds = time.perf_counter() - time_beg
+
+    def run(self) -> dict:
+        """
+        Method to run pipeline. Nodes start as soon as all their inputs are ready,
+        nodes depending on failed node are skipped.
+        :return: dictionary {node name: result}
+        """
+        for node in self.nodes.values():
+            node.status, node.seconds, node.rows, node.error = 'pending', 0.0, None, None
+            node.result, node.key, node.output_id = None, None, None
+        pending = dict(self.nodes)
+        running = {}
+        finished = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name, node in list(pending.items()):
+                    if not all(input_name in finished for input_name in node.inputs):
+                        continue
+                    del pending[name]
+                    if all(self.nodes[input_name].status in ('run', 'cached') for input_name in node.inputs):
+                        running[executor.submit(self._run_node, node)] = node
+                    else:
+                        node.status = 'skipped'
+                        finished.add(name)
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finished.add(running.pop(future).name)
+        return {name: node.result for name, node in self.nodes.items()}
+
+    def summary(self) -> list:
+        """
+        Method to return timing breakdown of last run.
+        :return: list of {'node', 'status', 'seconds', 'rows', 'error'}
+        """
+        return [{'node': node.name, 'status': node.status, 'seconds': node.seconds,
+                 'rows': node.rows, 'error': node.error} for node in self.nodes.values()]
+
+    def report(self) -> str:
+        """
+        Method to print timing breakdown of last run.
+        :return: summary table
+        """
+        lines = [f"{'node':<30}{'status':>10}{'seconds':>11}{'rows':>12}"]
+        for item in self.summary():
+            rows = '' if item['rows'] is None else item['rows']
+            lines.append(f"{item['node']:<30}{item['status']:>10}{item['seconds']:>11.3f}{rows:>12}")
+        table = '\n'.join(lines)
+        print(table)
+        return table
+
+
+profiling.instrument(sys.modules[__name__])
@@ -0,0 +1,261 @@
+import os
+import sys
+import time
+import atexit
+import functools
+import threading
+
+PROFILE_ENV = 'PKOFFICE_PROFILE'
+PROFILE_FILE_ENV = 'PKOFFICE_PROFILE_FILE'
+
+_enabled = False
+_memory = False
+_profiler = None
+_stats = {}
+_lock = threading.Lock()
+_local = threading.local()
+_wrapped = []
+
+
+def _rows(obj) -> int:
+    """
+    Function to count rows of dataframe (or other object with shape)
+    :param obj: any object
+    :return: number of rows or None
+    """
+    shape = getattr(obj, 'shape', None)
+    if isinstance(shape, tuple) and shape:
+        return shape[0]
+    return None
+
+
+def _record(name: str, wall: float, cpu: float, rows: int, peak: int, calls: int = 1) -> None:
+    with _lock:
+        item = _stats.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'rows': 0, 'peak': 0})
+        item['calls'] += calls
+        item['wall'] += wall
+        item['cpu'] += cpu
+        item['rows'] += rows or 0
+        item['peak'] = max(item['peak'], peak)
+
+
+def _memory_enter() -> None:
+    if _memory:
+        import tracemalloc
+        current, peak = tracemalloc.get_traced_memory()
+        stack = _local.__dict__.setdefault('memory', [])
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        stack.append([current, 0])
+
+
+def _memory_exit() -> int:
+    """
+    Function to close memory measurement of call.
+    :return: peak memory allocated during call in bytes
+    """
+    if not _memory:
+        return 0
+    import tracemalloc
+    stack = _local.__dict__.get('memory')
+    if not stack:
+        return 0
+    start, peak_children = stack.pop()
+    peak = max(tracemalloc.get_traced_memory()[1], peak_children)
+    if stack:
+        stack[-1][1] = max(stack[-1][1], peak)
+    return max(peak - start, 0)
+
+
+def _wrap(name: str, func):
+    """
+    Function to wrap function with measurement of calls, time, rows and memory.
+    :param name: name used in summary
+    :param func: function to wrap
+    :return: wrapped function
+    """
+    import inspect
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            gen = func(*args, **kwargs)
+            calls = 1
+            try:
+                while True:
+                    wall, cpu = time.perf_counter(), time.process_time()
+                    _memory_enter()
+                    item, rows = None, None
+                    try:
+                        item = next(gen)
+                        rows = _rows(item)
+                    except StopIteration:
+                        return
+                    finally:
+                        _record(name, time.perf_counter() - wall, time.process_time() - cpu,
+                                rows, _memory_exit(), calls)
+                        calls = 0
+                    yield item
+            finally:
+                # consumer stopped early, inner generator releases its resources now, not in GC
+                gen.close()
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            wall, cpu = time.perf_counter(), time.process_time()
+            _memory_enter()
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                rows = _rows(result)
+                if rows is None:
+                    rows = next((r for r in map(_rows, args) if r is not None), None)
+                _record(name, time.perf_counter() - wall, time.process_time() - cpu,
+                        rows, _memory_exit())
+    wrapper.__pkoffice_profiled__ = True
+    return wrapper
+
+
+def _wrap_attr(owner, attr: str, name: str, func) -> None:
+    if not getattr(func, '__pkoffice_profiled__', False):
+        setattr(owner, attr, _wrap(name, func))
+        _wrapped.append((owner, attr, func))
+
+
+def instrument(module) -> None:
+    """
+    Function to wrap public functions and class methods defined in module. Every pkoffice
+    submodule calls it at its end, so it is instrumented however it is imported.
+    :param module: imported pkoffice submodule
+    :return: None
+    """
+    if not _enabled or module.__name__ == __name__:
+        return
+    import inspect
+    prefix = module.__name__.rsplit('.', 1)[-1]
+    for attr, value in list(vars(module).items()):
+        if attr.startswith('_') or getattr(value, '__module__', None) != module.__name__:
+            continue
+        if inspect.isfunction(value):
+            _wrap_attr(module, attr, f'{prefix}.{attr}', value)
+        elif inspect.isclass(value):
+            for method_name, method in list(vars(value).items()):
+                if inspect.isfunction(method) and not method_name.startswith('_'):
+                    _wrap_attr(value, method_name, f'{prefix}.{attr}.{method_name}', method)
+
+
+def enable(memory: bool = False, cprofile: bool = False) -> None:
+    """
+    Function to switch on profiling of pkoffice modules. Modules already imported are
+    instrumented now, the rest when they are imported.
+    :param memory: flag to measure peak memory with tracemalloc (slows down execution)
+    :param cprofile: flag to collect cProfile statistics too
+    :return: None
+    """
+    global _enabled, _memory, _profiler
+    _enabled = True
+    if memory and not _memory:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _memory = True
+    if cprofile and _profiler is None:
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    for name, module in list(sys.modules.items()):
+        if name.startswith('pkoffice.') and name != __name__:
+            instrument(module)
+
+
+def disable() -> None:
+    """
+    Function to switch off profiling and restore original functions.
+    Collected statistics are kept.
+    :return: None
+    """
+    global _enabled, _memory
+    _enabled = False
+    while _wrapped:
+        owner, attr, func = _wrapped.pop()
+        setattr(owner, attr, func)
+    if _memory:
+        import tracemalloc
+        tracemalloc.stop()
+        _memory = False
+    if _profiler is not None:
+        _profiler.disable()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    """
+    Function to clear collected statistics.
+    :return: None
+    """
+    global _profiler
+    with _lock:
+        _stats.clear()
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler = None
+
+
+def summary() -> list:
+    """
+    Function to return collected statistics sorted by wall time.
+    :return: list of {'function', 'calls', 'wall', 'cpu', 'rows', 'peak_mb'}
+    """
+    with _lock:
+        items = [{'function': name, 'calls': item['calls'], 'wall': item['wall'],
+                  'cpu': item['cpu'], 'rows': item['rows'], 'peak_mb': item['peak'] / 2 ** 20}
+                 for name, item in _stats.items()]
+    return sorted(items, key=lambda x: x['wall'], reverse=True)
+
+
+def report(file_path: str = None) -> str:
+    """
+    Function to print summary table of run.
+    :param file_path: optional path to save summary table
+    :return: summary table
+    """
+    lines = [f"{'function':<45}{'calls':>8}{'wall [s]':>11}{'cpu [s]':>11}{'rows':>12}{'peak [MB]':>11}"]
+    for item in summary():
+        lines.append(f"{item['function']:<45}{item['calls']:>8}{item['wall']:>11.3f}"
+                     f"{item['cpu']:>11.3f}{item['rows']:>12}{item['peak_mb']:>11.1f}")
+    table = '\n'.join(lines)
+    print(table)
+    if file_path is not None:
+        with open(file_path, 'w') as f:
+            f.write(table + '\n')
+    return table
+
+
+def dump_stats(file_path: str) -> None:
+    """
+    Function to save cProfile statistics to pstats file (enable(cprofile=True) is needed).
+    :param file_path: path to pstats file
+    :return: None
+    """
+    if _profiler is None:
+        print('cProfile statistics were not collected.')
+        return
+    _profiler.dump_stats(file_path)
+
+
+def _report_at_exit() -> None:
+    if _stats:
+        report()
+    if os.environ.get(PROFILE_FILE_ENV):
+        dump_stats(os.environ[PROFILE_FILE_ENV])
+
+
+if os.environ.get(PROFILE_ENV):
+    enable(memory='memory' in os.environ[PROFILE_ENV].lower(),
+           cprofile=bool(os.environ.get(PROFILE_FILE_ENV)))
+    atexit.register(_report_at_exit)
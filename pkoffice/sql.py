@@ -2,9 +2,11 @@ import re
 import sqlalchemy as sql
 import pandas as pd
 import threading
+import sys
 from typing import Literal
 from datetime import datetime
 from pkoffice import file
+from pkoffice import profiling
 
 TMP_FILE = 'tmp.csv'
 
@@ -248,4 +250,7 @@ class SqlDB:
         with self.engine.begin() as conn:
             conn.execute(
                 f"""Insert into dbo.[{table_name}]
-                Values ({sql_values})""")
\ No newline at end of file
+                Values ({sql_values})""")
+
+
+profiling.instrument(sys.modules[__name__])